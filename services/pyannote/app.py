@@ -13,20 +13,93 @@ speaker turns with timestamps in milliseconds:
 """
 
 import io
+import logging
 import os
-import tempfile
-from typing import Dict, List
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
 
+import numpy as np
 import soundfile as sf
+import soxr
 import torch
 import torchaudio
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 
 app = FastAPI(title="ThirdParty Pyannote Diarizer")
+logger = logging.getLogger("uvicorn.error")
+
+# ~500 MB is about 4.5h of 16 kHz PCM16; larger bodies get 413 before decoding.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+
+class _BodyLimitMiddleware:
+    """
+    Buffer the request body at the ASGI layer with a running size guard and
+    answer 413 as soon as Content-Length or the received bytes exceed
+    max_bytes, before any handler or decoder sees the upload. The buffered
+    body is stored on request.state.body (a bytearray) and replayed to the app.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+        # One growing bytearray, handed on as-is: no join or bytes() copy.
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            if len(body) + len(chunk) > self.max_bytes:
+                await self._reject(scope, receive, send)
+                return
+            body += chunk
+            more_body = message.get("more_body", False)
+        scope.setdefault("state", {})["body"] = body
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload too large (limit {self.max_bytes} bytes)"},
+        )
+        await response(scope, receive, send)
+
+
+app.add_middleware(_BodyLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
 
 TARGET_SR = 16000
+DECODE_BLOCK_FRAMES = 1 << 20
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 _pipeline = None
+# Resamplers keyed by source sample rate, built once per rate: torchaudio
+# Resample modules on CUDA, soxr streams (cleared after each use) on CPU.
+# Only common rates are cached (and only they use torchaudio on CUDA); any
+# other client-supplied rate goes through an uncached soxr.resample on CPU.
+CACHED_SAMPLE_RATES = frozenset({8000, 11025, 22050, 24000, 32000, 44100, 48000})
+_resamplers: Dict[int, object] = {}
 
 
 def _auth_token() -> str:
@@ -52,31 +125,225 @@ def _load_pipeline():
             "pyannote/speaker-diarization-3.1",
             use_auth_token=token,
         )
-        if torch.cuda.is_available():
-            _pipeline.to(torch.device("cuda"))
+        if DEVICE.type == "cuda":
+            _pipeline.to(DEVICE)
+            _compile_submodels(_pipeline)
     return _pipeline
 
 
-def _normalize_audio(raw: bytes) -> str:
+def _compile_with_fallback(module: torch.nn.Module, name: str) -> None:
+    """
+    Replace module.forward with a torch.compile'd version. If a compiled call
+    ever raises (e.g. a recompile for a new shape fails), the module is put
+    back to eager for good and the call is retried eagerly.
+    """
+    eager = module.forward
+    compiled = torch.compile(eager, mode="reduce-overhead", dynamic=True)
+
+    def forward(*args, **kwargs):
+        try:
+            return compiled(*args, **kwargs)
+        except Exception as exc:
+            del module.forward
+            logger.warning("torch.compile of %s model failed; using eager: %s", name, exc)
+            return eager(*args, **kwargs)
+
+    module.forward = forward
+
+
+def _compile_submodels(pipeline) -> None:
+    """
+    torch.compile the segmentation and embedding nets (mode="reduce-overhead",
+    so CUDA graphs amortize launch cost; dynamic=True, so the pipeline's
+    partial last batches do not recompile) and warm each the way the pipeline
+    calls it: segmentation on segmentation_batch_size chunks, embedding on
+    embedding_batch_size chunks with frame weights. Attribute names differ
+    across pyannote versions, hence the getattr guards.
+    """
+    inference = getattr(pipeline, "_segmentation", None)
+    segmentation = getattr(inference, "model", None)
+    embedding = getattr(getattr(pipeline, "_embedding", None), "model_", None)
+    num_samples = int(round(float(getattr(inference, "duration", 10.0)) * TARGET_SR))
+    num_frames = None
+
+    if isinstance(segmentation, torch.nn.Module):
+        _compile_with_fallback(segmentation, "segmentation")
+        batch_size = int(getattr(pipeline, "segmentation_batch_size", 1))
+        try:
+            with _inference():
+                chunks = torch.zeros(batch_size, 1, num_samples, device=DEVICE)
+                num_frames = segmentation(chunks).shape[1]
+        except Exception as exc:
+            logger.warning("Segmentation warmup failed: %s", exc)
+
+    if isinstance(embedding, torch.nn.Module):
+        _compile_with_fallback(embedding, "embedding")
+        batch_size = int(getattr(pipeline, "embedding_batch_size", 1))
+        try:
+            with _inference():
+                chunks = torch.zeros(batch_size, 1, num_samples, device=DEVICE)
+                weights = None
+                if num_frames is not None:
+                    weights = torch.ones(batch_size, num_frames, device=DEVICE)
+                embedding(chunks, weights=weights)
+        except Exception as exc:
+            logger.warning("Embedding warmup failed: %s", exc)
+
+
+@contextmanager
+def _inference():
+    """
+    inference_mode only, in FP32. No FP16 autocast: the pipeline's WeSpeaker
+    embedding computes kaldi fbank on a 2^15-scaled waveform, and its
+    power-spectrum matmul overflows float16 (inf/NaN features).
+    """
+    with torch.inference_mode():
+        yield
+
+
+def _resample(tensor: torch.Tensor, sr: int) -> torch.Tensor:
+    """
+    Resample a (1, samples) tensor from sr to TARGET_SR with a cached filter:
+    soxr (SIMD polyphase, HQ) on CPU, torchaudio conv1d on CUDA. Rates outside
+    CACHED_SAMPLE_RATES always use uncached soxr on CPU, then move to DEVICE.
     """
-    Write normalized mono 16k WAV temp file and return path.
+    if sr not in CACHED_SAMPLE_RATES:
+        out = soxr.resample(tensor[0].cpu().contiguous().numpy(), sr, TARGET_SR, quality="HQ")
+        return torch.from_numpy(out).unsqueeze(0).to(DEVICE)
+    rs = _resamplers.get(sr)
+    if DEVICE.type == "cpu":
+        if rs is None:
+            rs = soxr.ResampleStream(sr, TARGET_SR, 1, dtype="float32", quality="HQ")
+            _resamplers[sr] = rs
+        try:
+            out = rs.resample_chunk(tensor[0].contiguous().numpy(), last=True)
+        finally:
+            rs.clear()
+        return torch.from_numpy(out).unsqueeze(0)
+    if rs is None:
+        rs = torchaudio.transforms.Resample(sr, TARGET_SR, lowpass_filter_width=6).to(DEVICE)
+        _resamplers[sr] = rs
+    return rs(tensor.to(DEVICE))
+
+
+class _BufferReader:
+    """
+    Read-only seekable file over a bytes-like body for soundfile. Unlike
+    io.BytesIO, this does not copy a bytearray.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = min(max(base + offset, 0), len(self._view))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readinto(self, buf) -> int:
+        n = min(len(buf), len(self._view) - self._pos)
+        buf[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+
+def _read_mono(raw: bytes) -> Tuple[torch.Tensor, int]:
+    """
+    Stream-decode with soundfile in blocks, downmixing each block into a
+    preallocated mono float32 tensor. Peak memory stays at one mono copy
+    plus one block, instead of the full multichannel decode.
+    """
+    with sf.SoundFile(_BufferReader(raw)) as f:
+        sr = f.samplerate
+        channels = f.channels
+        out = torch.empty(f.frames, dtype=torch.float32)
+        if channels == 1:
+            # Mono: decode straight into the tensor's memory, no downmix or copy.
+            n = len(f.read(dtype="float32", out=out.numpy()))
+            return out[:n], sr
+        # Multichannel: reuse one block buffer and sum channels into the output slice.
+        block_rows = max(1, min(DECODE_BLOCK_FRAMES, f.frames))
+        block_buf = np.empty((block_rows, channels), dtype=np.float32)
+        pos = 0
+        for block in f.blocks(dtype="float32", always_2d=True, out=block_buf):
+            n = block.shape[0]
+            torch.sum(torch.from_numpy(block), dim=-1, out=out[pos:pos + n])
+            pos += n
+    return out[:pos].mul_(1.0 / channels), sr
+
+
+def _check_sample_rate(sr: int) -> int:
+    """Reject client-supplied sample rates outside [MIN_SAMPLE_RATE, MAX_SAMPLE_RATE]."""
+    if not MIN_SAMPLE_RATE <= sr <= MAX_SAMPLE_RATE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported sample rate {sr} (expected {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz)",
+        )
+    return sr
+
+
+def _normalize_audio(raw: bytes) -> Dict[str, object]:
+    """
+    Decode to a mono 16k (1, samples) tensor and return it as pyannote's
+    in-memory input, {"waveform": tensor, "sample_rate": TARGET_SR}.
     """
     try:
-        wav, sr = sf.read(io.BytesIO(raw), dtype="float32")
+        wav, sr = _read_mono(raw)
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Could not parse audio bytes: {exc}") from exc
 
-    if wav.ndim == 2:
-        wav = wav.mean(axis=1)
-
-    tensor = torch.from_numpy(wav).unsqueeze(0)
+    tensor = wav.unsqueeze(0)
     if sr != TARGET_SR:
-        tensor = torchaudio.functional.resample(tensor, sr, TARGET_SR)
+        tensor = _resample(tensor, _check_sample_rate(sr))
 
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-        output = tmp.name
-    sf.write(output, tensor.squeeze(0).numpy(), TARGET_SR)
-    return output
+    # pyannote crops windows out of this tensor; keep it one dense buffer.
+    return {"waveform": tensor.contiguous(), "sample_rate": TARGET_SR}
+
+
+def _seconds_to_ms(values: List[float]) -> np.ndarray:
+    """
+    Clamp to >= 0 and round seconds to integer milliseconds in one vectorized pass.
+    """
+    seconds = np.clip(np.asarray(values, dtype=np.float64), 0.0, None)
+    return np.rint(seconds * 1000.0).astype(np.int64)
+
+
+def _chronological_order(starts_ms: np.ndarray, ends_ms: np.ndarray):
+    """
+    Index that orders turns by (start_ms, end_ms). pyannote usually yields
+    turns in order already, so a linear check skips the sort in that case.
+    """
+    d_start = np.diff(starts_ms)
+    d_end = np.diff(ends_ms)
+    if np.all((d_start > 0) | ((d_start == 0) & (d_end >= 0))):
+        return slice(None)
+    return np.lexsort((ends_ms, starts_ms))
+
+
+@app.on_event("startup")
+async def _warmup_pipeline():
+    """
+    Load the pipeline and run it once on 10s of silence (one full segmentation
+    window) so the first /diarize call does not pay model download, CUDA init
+    and cuDNN autotune.
+    """
+    try:
+        pipeline = _load_pipeline()
+        silence = torch.zeros(1, 10 * TARGET_SR, device=DEVICE)
+        with _inference():
+            pipeline({"waveform": silence, "sample_rate": TARGET_SR})
+    except Exception as exc:
+        logger.warning("Pipeline warmup failed; it will load on first request: %s", exc)
 
 
 @app.get("/health")
@@ -86,39 +353,50 @@ def health():
 
 @app.post("/diarize")
 async def diarize(request: Request):
-    raw = await request.body()
+    raw = request.state.body
     if len(raw) < 1600:
         raise HTTPException(status_code=400, detail="Audio too short.")
 
-    wav_path = None
     try:
-        wav_path = _normalize_audio(raw)
+        audio = _normalize_audio(raw)
         pipeline = _load_pipeline()
-        diarization = pipeline(wav_path)
-
-        speaker_map: Dict[str, str] = {}
-        segments: List[dict] = []
-        speaker_index = 0
+        with _inference():
+            diarization = pipeline(audio)
 
+        starts: List[float] = []
+        ends: List[float] = []
+        labels: List[str] = []
         for turn, _, speaker in diarization.itertracks(yield_label=True):
-            if speaker not in speaker_map:
-                speaker_map[speaker] = f"S{speaker_index}"
-                speaker_index += 1
-            segments.append(
-                {
-                    "speaker": speaker_map[speaker],
-                    "start_ms": int(round(max(0.0, float(turn.start)) * 1000)),
-                    "end_ms": int(round(max(0.0, float(turn.end)) * 1000)),
-                }
-            )
+            starts.append(turn.start)
+            ends.append(turn.end)
+            labels.append(str(speaker))
 
-        segments.sort(key=lambda seg: (seg["start_ms"], seg["end_ms"]))
-        duration_sec = (segments[-1]["end_ms"] / 1000.0) if segments else 0.0
+        starts_ms = _seconds_to_ms(starts)
+        ends_ms = _seconds_to_ms(ends)
+        order = _chronological_order(starts_ms, ends_ms)
+
+        # Speakers are numbered S0, S1, ... in order of first appearance.
+        uniq, first_index, inverse = np.unique(
+            np.asarray(labels, dtype=str), return_index=True, return_inverse=True
+        )
+        speaker_ids = np.empty(len(uniq), dtype=np.int64)
+        speaker_ids[np.argsort(first_index)] = np.arange(len(uniq))
+        seg_speakers = speaker_ids[inverse.reshape(-1)]
+        # One label string per speaker, not per turn.
+        speaker_names = [f"S{i}" for i in range(len(uniq))]
+
+        segments: List[dict] = [
+            {"speaker": speaker_names[spk], "start_ms": start, "end_ms": end}
+            for spk, start, end in zip(
+                seg_speakers[order].tolist(), starts_ms[order].tolist(), ends_ms[order].tolist()
+            )
+        ]
+        duration_sec = (int(ends_ms.max()) / 1000.0) if segments else 0.0
 
         return JSONResponse(
             content={
                 "duration_sec": duration_sec,
-                "speaker_count": len(speaker_map),
+                "speaker_count": len(uniq),
                 "segments": segments,
             }
         )
@@ -126,9 +404,3 @@ async def diarize(request: Request):
         raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
-    finally:
-        if wav_path and os.path.exists(wav_path):
-            try:
-                os.unlink(wav_path)
-            except Exception:
-                pass
@@ -1,44 +1,182 @@
 """
 Speaker embedding service using SpeechBrain ECAPA-TDNN (spkrec-ecapa-voxceleb).
-- POST /embed: audio (WAV or raw PCM 16kHz mono) -> { "embedding": [float, ...] }  (192 dims)
+- POST /embed: audio (WAV or raw PCM 16kHz mono) -> { "embedding": [float, ...] }  (192 dims),
+  or raw little-endian float16 bytes with Accept: application/octet-stream
 - POST /verify: two audio files -> { "same_speaker": bool, "score": float }
 
 Model expects 16kHz mono. We resample if needed.
 """
 
+import asyncio
 import io
+import logging
 import os
-import tempfile
+from contextlib import contextmanager
+from typing import Tuple
 import numpy as np
+import orjson
 import torch
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 app = FastAPI(title="Speaker Embedder (ECAPA-TDNN)")
+logger = logging.getLogger("uvicorn.error")
+
+# ~500 MB is about 4.5h of 16 kHz PCM16; larger bodies get 413 before decoding.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+
+
+class _BodyLimitMiddleware:
+    """
+    Buffer the request body at the ASGI layer with a running size guard and
+    answer 413 as soon as Content-Length or the received bytes exceed
+    max_bytes, before any handler or decoder sees the upload. The buffered
+    body is stored on request.state.body (a bytearray) and replayed to the app.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            await self._reject(scope, receive, send)
+            return
+        # One growing bytearray, handed on as-is: no join or bytes() copy.
+        body = bytearray()
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            if len(body) + len(chunk) > self.max_bytes:
+                await self._reject(scope, receive, send)
+                return
+            body += chunk
+            more_body = message.get("more_body", False)
+        scope.setdefault("state", {})["body"] = body
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload too large (limit {self.max_bytes} bytes)"},
+        )
+        await response(scope, receive, send)
+
+
+app.add_middleware(_BodyLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
 
 _classifier = None
 _verification = None
 TARGET_SR = 16000
+# Same default as SpeakerRecognition.verify_files / verify_batch.
+VERIFY_THRESHOLD = 0.25
+DECODE_BLOCK_FRAMES = 1 << 20
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+# Leading bytes of containers soundfile decodes: WAV/RF64/W64, AIFF, OGG, FLAC,
+# CAF, AU and ID3-tagged MP3. Anything else is treated as raw PCM16.
+CONTAINER_MAGICS = (b"RIFF", b"RF64", b"riff", b"FORM", b"OggS", b"fLaC", b"caff", b".snd", b"ID3")
+# Untagged MP3 (MPEG-1/2 Layer III) starts with a frame sync, which raw PCM can
+# also start with, so it is only sent to soundfile when the first frame header is
+# valid and a matching second header sits where the first frame ends.
+MPEG_FRAME_SYNCS = (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2")
+# Layer III bitrates (kbps) by bitrate index, and sample rates by rate index,
+# keyed by the header's version bits (3 = MPEG-1, 2 = MPEG-2).
+MPEG_L3_KBPS = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000)}
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# /embed micro-batching: requests arriving within the window share one forward.
+MAX_BATCH = 8
+BATCH_WINDOW_SEC = 0.005
+# Cap on padded batch size (B * max_len samples, 8 x 10s). A clip that would push a
+# batch past it starts the next batch; a clip longer than the cap runs alone.
+BATCH_MAX_SAMPLES = MAX_BATCH * 10 * TARGET_SR
+_embed_queue = None
+_embed_task = None
+# Pinned host buffer for async HtoD copies of /embed batches (allocated on first CUDA use).
+# Sized to the batch cap, so only a lone clip longer than that skips it.
+STAGING_SAMPLES = BATCH_MAX_SAMPLES
+_staging = None
+# Resamplers keyed by source sample rate, built once per rate: torchaudio
+# Resample modules on CUDA, soxr streams (cleared after each use) on CPU.
+# Only common rates are cached (and only they use torchaudio on CUDA); any
+# other client-supplied rate goes through an uncached soxr.resample on CPU.
+CACHED_SAMPLE_RATES = frozenset({8000, 11025, 22050, 24000, 32000, 44100, 48000})
+_resamplers = {}
 
 
 def _load_classifier():
     global _classifier
     if _classifier is None:
         from speechbrain.inference.speaker import EncoderClassifier
-        run_opts = {"device": "cuda"} if torch.cuda.is_available() else {}
+        run_opts = {"device": "cuda"} if DEVICE.type == "cuda" else {}
         _classifier = EncoderClassifier.from_hparams(
             source="speechbrain/spkrec-ecapa-voxceleb",
             savedir="pretrained_models/spkrec-ecapa-voxceleb",
             run_opts=run_opts,
         )
+        _compile_embedding_model(_classifier)
     return _classifier
 
 
+def _compile_embedding_model(classifier):
+    """
+    Replace classifier.mods.embedding_model with a frozen TorchScript version.
+    Tries torch.jit.script first, then torch.jit.trace on a 1s input. The
+    compiled model is only kept if it matches eager output on a padded batch
+    of a different length, since tracing can bake in shapes; otherwise eager
+    stays in place.
+    """
+    model = classifier.mods.embedding_model.eval()
+
+    def _features(n_samples: int, lens: list):
+        wav = torch.zeros(len(lens), n_samples, device=DEVICE).uniform_(-0.5, 0.5)
+        lens = torch.tensor(lens, device=DEVICE)
+        feats = classifier.mods.compute_features(wav)
+        return classifier.mods.mean_var_norm(feats, lens), lens
+
+    try:
+        with torch.no_grad():
+            try:
+                compiled = torch.jit.script(model)
+            except Exception:
+                compiled = torch.jit.trace(model, _features(TARGET_SR, [1.0]))
+            compiled = torch.jit.freeze(compiled.eval())
+            check = _features(2 * TARGET_SR, [1.0, 0.6])
+            # Two calls: the first runs the JIT profiling/optimization pass.
+            compiled(*check)
+            if not torch.allclose(compiled(*check), model(*check), atol=1e-4):
+                raise RuntimeError("compiled output differs from eager")
+    except Exception as e:
+        logger.warning("TorchScript compile of embedding model skipped: %s", e)
+        return
+    classifier.mods.embedding_model = compiled
+
+
 def _load_verification():
     global _verification
     if _verification is None:
         from speechbrain.inference.speaker import SpeakerRecognition
-        run_opts = {"device": "cuda"} if torch.cuda.is_available() else {}
+        run_opts = {"device": "cuda"} if DEVICE.type == "cuda" else {}
         _verification = SpeakerRecognition.from_hparams(
             source="speechbrain/spkrec-ecapa-voxceleb",
             savedir="pretrained_models/spkrec-ecapa-voxceleb",
@@ -47,36 +185,333 @@ def _load_verification():
     return _verification
 
 
+@torch.jit.script
+def _verify_pair(
+    a: torch.Tensor, b: torch.Tensor, threshold: float
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Cosine score of two embeddings and whether it clears threshold, as one scripted op."""
+    score = torch.nn.functional.cosine_similarity(a, b, dim=-1, eps=1e-6)
+    return score, score > threshold
+
+
+@contextmanager
+def _inference():
+    """inference_mode plus FP16 autocast on CUDA; plain FP32 on CPU."""
+    with torch.inference_mode(), torch.autocast(
+        device_type="cuda", dtype=torch.float16, enabled=DEVICE.type == "cuda"
+    ):
+        yield
+
+
+def _resample(t: torch.Tensor, sr: int) -> torch.Tensor:
+    """
+    Resample a (1, samples) tensor from sr to TARGET_SR with a cached filter:
+    soxr (SIMD polyphase, HQ) on CPU, torchaudio conv1d on CUDA. Rates outside
+    CACHED_SAMPLE_RATES always use uncached soxr on CPU, then move to DEVICE.
+    """
+    if sr not in CACHED_SAMPLE_RATES:
+        import soxr
+        out = soxr.resample(t[0].cpu().contiguous().numpy(), sr, TARGET_SR, quality="HQ")
+        return torch.from_numpy(out).unsqueeze(0).to(DEVICE)
+    rs = _resamplers.get(sr)
+    if DEVICE.type == "cpu":
+        if rs is None:
+            import soxr
+            rs = soxr.ResampleStream(sr, TARGET_SR, 1, dtype="float32", quality="HQ")
+            _resamplers[sr] = rs
+        try:
+            out = rs.resample_chunk(t[0].contiguous().numpy(), last=True)
+        finally:
+            rs.clear()
+        return torch.from_numpy(out).unsqueeze(0)
+    if rs is None:
+        import torchaudio
+        rs = torchaudio.transforms.Resample(sr, TARGET_SR, lowpass_filter_width=6).to(DEVICE)
+        _resamplers[sr] = rs
+    return rs(t.to(DEVICE))
+
+
+def _to_device(t: torch.Tensor) -> torch.Tensor:
+    """
+    Move a float32 tensor to DEVICE. CPU tensors on a CUDA host go through
+    a pinned staging buffer so the copy is a non-blocking DMA; tensors larger
+    than the buffer take a plain copy (pinning per call costs more than it saves).
+    """
+    global _staging
+    if DEVICE.type != "cuda" or t.device.type == "cuda":
+        return t.to(DEVICE)
+    n = t.numel()
+    if n > STAGING_SAMPLES:
+        return t.to(DEVICE)
+    if _staging is None:
+        _staging = torch.empty(STAGING_SAMPLES, dtype=torch.float32, pin_memory=True)
+    _staging[:n].copy_(t.reshape(-1))
+    return _staging[:n].view(t.shape).to(DEVICE, non_blocking=True)
+
+
+def _pad_batch(signals):
+    """
+    Zero-pad (1, samples) signals into a (B, max_len) batch on DEVICE.
+    Returns (batch, wav_lens) with wav_lens relative to max_len, as
+    encode_batch expects for masking the padding.
+    """
+    lengths = [sig.shape[-1] for sig in signals]
+    max_len = max(lengths)
+    batch = torch.zeros(len(signals), max_len)
+    on_device = []
+    for i, sig in enumerate(signals):
+        if sig.device.type == "cpu":
+            batch[i, :lengths[i]] = sig[0]
+        else:
+            on_device.append(i)
+    batch = _to_device(batch)
+    for i in on_device:
+        batch[i, :lengths[i]] = signals[i][0]
+    wav_lens = torch.tensor(lengths, dtype=torch.float32, device=DEVICE) / max_len
+    return batch, wav_lens
+
+
+async def _embed_batcher():
+    """
+    Drain _embed_queue: take the first waiting request, collect more for up to
+    BATCH_WINDOW_SEC (or until MAX_BATCH, or until the padded batch would exceed
+    BATCH_MAX_SAMPLES), run one padded encode_batch and resolve each request's
+    future with its (dims,) embedding.
+    """
+    loop = asyncio.get_running_loop()
+    held = None
+    while True:
+        items = [held if held is not None else await _embed_queue.get()]
+        held = None
+        max_len = items[0][0].shape[-1]
+        deadline = loop.time() + BATCH_WINDOW_SEC
+        while len(items) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(_embed_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            n = item[0].shape[-1]
+            if (len(items) + 1) * max(max_len, n) > BATCH_MAX_SAMPLES:
+                held = item
+                break
+            items.append(item)
+            max_len = max(max_len, n)
+        try:
+            batch, wav_lens = _pad_batch([sig for sig, _ in items])
+            with _inference():
+                emb = _load_classifier().encode_batch(batch, wav_lens)
+            emb = emb.squeeze(1).float().cpu()
+        except Exception as e:
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            continue
+        for (_, fut), row in zip(items, emb):
+            if not fut.done():
+                fut.set_result(row)
+
+
+async def _embed_signal(signal: torch.Tensor) -> torch.Tensor:
+    """Queue a (1, samples) signal for the batcher and wait for its embedding."""
+    global _embed_queue, _embed_task
+    if _embed_task is None or _embed_task.done():
+        _embed_queue = asyncio.Queue()
+        _embed_task = asyncio.create_task(_embed_batcher())
+    fut = asyncio.get_running_loop().create_future()
+    await _embed_queue.put((signal, fut))
+    return await fut
+
+
+class _BufferReader:
+    """
+    Read-only seekable file over a bytes-like body for soundfile. Unlike
+    io.BytesIO, this does not copy a bytearray.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = min(max(base + offset, 0), len(self._view))
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def readinto(self, buf) -> int:
+        n = min(len(buf), len(self._view) - self._pos)
+        buf[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return data
+
+
+def _read_mono(raw: bytes):
+    """
+    Stream-decode with soundfile in blocks, downmixing each block into a
+    preallocated mono float32 tensor. Returns ((samples,) tensor, sample_rate).
+    """
+    import soundfile as sf
+    with sf.SoundFile(_BufferReader(raw)) as f:
+        sr = f.samplerate
+        channels = f.channels
+        out = torch.empty(f.frames, dtype=torch.float32)
+        if channels == 1:
+            # Mono: decode straight into the tensor's memory, no downmix or copy.
+            n = len(f.read(dtype="float32", out=out.numpy()))
+            return out[:n], sr
+        # Multichannel: reuse one block buffer and sum channels into the output slice.
+        block_rows = max(1, min(DECODE_BLOCK_FRAMES, f.frames))
+        block_buf = np.empty((block_rows, channels), dtype=np.float32)
+        pos = 0
+        for block in f.blocks(dtype="float32", always_2d=True, out=block_buf):
+            n = block.shape[0]
+            torch.sum(torch.from_numpy(block), dim=-1, out=out[pos:pos + n])
+            pos += n
+    return out[:pos].mul_(1.0 / channels), sr
+
+
+def _check_sample_rate(sr: int) -> int:
+    """Reject client-supplied sample rates outside [MIN_SAMPLE_RATE, MAX_SAMPLE_RATE]."""
+    if not MIN_SAMPLE_RATE <= sr <= MAX_SAMPLE_RATE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported sample rate {sr} (expected {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz)",
+        )
+    return sr
+
+
+def _parse_sample_rate(value: str, source: str) -> int:
+    """Parse a declared sample rate (ASCII digits only) and range-check it; 400 otherwise."""
+    value = value.strip()
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPException(status_code=400, detail=f"Invalid sample rate in {source}: {value!r}")
+    return _check_sample_rate(int(value))
+
+
+def _pcm16_format(headers):
+    """
+    Detect a raw PCM16 upload from request headers. Returns (sample_rate, dtype)
+    for `audio/L16` (big-endian per RFC 2586, `rate` param or X-Sample-Rate) or
+    for `application/octet-stream` with an X-Sample-Rate hint (little-endian);
+    None when the body should be sniffed as a container format instead.
+    Raises 400 when a declared rate is malformed or out of range.
+    """
+    content_type = (headers.get("content-type", "") or "").lower()
+    mime, *params = [part.strip() for part in content_type.split(";")]
+    hint = (headers.get("x-sample-rate", "") or "").strip()
+    if mime == "audio/l16":
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "rate":
+                return _parse_sample_rate(value, "audio/L16 rate"), ">i2"
+        if hint:
+            return _parse_sample_rate(hint, "X-Sample-Rate"), ">i2"
+        return TARGET_SR, ">i2"
+    if mime == "application/octet-stream" and hint:
+        return _parse_sample_rate(hint, "X-Sample-Rate"), "<i2"
+    return None
+
+
+def _pcm16_to_tensor(raw: bytes, sample_rate: int, dtype: str = "<i2") -> torch.Tensor:
+    """
+    Decode raw PCM16 mono into a (1, samples) float32 tensor at TARGET_SR.
+    The int16 view aliases the request bytes; astype is the only copy.
+    """
+    arr = np.frombuffer(raw, dtype=dtype, count=len(raw) // 2)
+    if len(arr) < 1600:
+        raise ValueError("Audio too short (need at least ~0.1s)")
+    wav = arr.astype(np.float32)
+    wav *= 1.0 / 32768.0
+    t = torch.from_numpy(wav).unsqueeze(0)
+    if sample_rate != TARGET_SR:
+        t = _resample(t, sample_rate)
+    return t
+
+
+def _mpeg_frame_length(header: bytes) -> int:
+    """Byte length of the Layer III frame whose 4-byte header this is, or 0 if invalid."""
+    if len(header) < 4 or not header.startswith(MPEG_FRAME_SYNCS):
+        return 0
+    version = (header[1] >> 3) & 3
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    kbps = MPEG_L3_KBPS[version][bitrate_index]
+    sr = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 1
+    return (144 if version == 3 else 72) * kbps * 1000 // sr + padding
+
+
+def _looks_like_mpeg(raw: bytes) -> bool:
+    """
+    True when raw opens with a valid Layer III frame header and a second one
+    with the same version/layer and sample rate follows at the offset the
+    first frame's length implies.
+    """
+    n = _mpeg_frame_length(raw[:4])
+    if n == 0 or _mpeg_frame_length(raw[n:n + 4]) == 0:
+        return False
+    return raw[n + 1] == raw[1] and (raw[n + 2] >> 2) & 3 == (raw[2] >> 2) & 3
+
+
 def _audio_to_tensor(raw: bytes, sample_rate_hint: int = 16000):
-    """Convert raw bytes to (1, samples) tensor at 16kHz. Accepts WAV or raw PCM."""
-    try:
-        import soundfile as sf
-        wav, sr = sf.read(io.BytesIO(raw), dtype="float32")
-        if wav.ndim == 2:
-            wav = wav.mean(axis=1)
+    """
+    Convert raw bytes to (1, samples) tensor at 16kHz. Accepts WAV (or another
+    soundfile container) or raw PCM, chosen by the leading magic bytes rather
+    than by letting soundfile fail first. Bodies that open with two chained
+    MPEG Layer III frame headers are tried with soundfile before falling
+    back to raw PCM.
+    """
+
+    def _decode_container():
+        wav, sr = _read_mono(raw)
+        t = wav.unsqueeze(0)
         if sr != TARGET_SR:
-            import torchaudio
-            t = torch.from_numpy(wav).unsqueeze(0)
-            t = torchaudio.functional.resample(t, sr, TARGET_SR)
-            wav = t.squeeze(0).numpy()
-        return torch.from_numpy(wav).unsqueeze(0), TARGET_SR
-    except Exception:
-        pass
-    # Fallback: treat as raw PCM 16-bit mono
-    try:
-        arr = np.frombuffer(raw, dtype=np.int16)
-        wav = arr.astype(np.float32) / 32768.0
-        if len(wav) < 1600:
-            raise ValueError("Audio too short (need at least ~0.1s)")
-        t = torch.from_numpy(wav).unsqueeze(0)
-        if sample_rate_hint != TARGET_SR:
-            import torchaudio
-            t = torchaudio.functional.resample(t, sample_rate_hint, TARGET_SR)
+            t = _resample(t, _check_sample_rate(sr))
         return t, TARGET_SR
+
+    try:
+        if raw.startswith(CONTAINER_MAGICS):
+            return _decode_container()
+        if _looks_like_mpeg(raw):
+            try:
+                return _decode_container()
+            except HTTPException:
+                raise
+            except Exception:
+                pass
+        # Raw PCM 16-bit mono
+        return _pcm16_to_tensor(raw, sample_rate_hint), TARGET_SR
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Could not parse audio: {e}")
 
 
+@app.on_event("startup")
+async def _warmup_models():
+    """Load both models and run one forward so the first request skips download/CUDA init."""
+    try:
+        dummy = torch.zeros(1, TARGET_SR, device=DEVICE)
+        with _inference():
+            _load_classifier().encode_batch(dummy)
+            _load_verification().encode_batch(dummy)
+    except Exception as e:
+        logger.warning("Model warmup failed; models will load on first request: %s", e)
+
+
 @app.get("/health")
 def health():
     return {"status": "ok", "model": "speechbrain/spkrec-ecapa-voxceleb"}
@@ -87,8 +522,12 @@ async def embed(request: Request):
     """
     Compute speaker embedding. Send audio as:
     - Raw body (application/octet-stream): WAV or raw PCM 16kHz mono, or
+    - Raw PCM16 mono as audio/L16 (;rate=N) or application/octet-stream with
+      X-Sample-Rate: N, which skips container probing, or
     - Multipart form with "audio" file.
-    Returns: { "embedding": [float, ...] } (192 dims).
+    Returns: { "embedding": [float, ...] } (192 dims), or with
+    Accept: application/octet-stream the embedding as raw little-endian
+    float16 bytes (384 bytes; dims in X-Embedding-Dims).
     """
     content_type = request.headers.get("content-type", "") or ""
     if "multipart" in content_type:
@@ -98,20 +537,31 @@ async def embed(request: Request):
             raise HTTPException(status_code=400, detail="Multipart form must include 'audio' file")
         raw = await f.read()
     else:
-        raw = await request.body()
+        raw = request.state.body
     if len(raw) < 1600:
         raise HTTPException(status_code=400, detail="Audio too short (need at least ~0.1s)")
+    pcm16 = _pcm16_format(request.headers)
     try:
-        signal, _ = _audio_to_tensor(raw)
+        if pcm16 is not None:
+            signal = _pcm16_to_tensor(raw, *pcm16)
+        else:
+            signal, _ = _audio_to_tensor(raw)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
-    classifier = _load_classifier()
-    with torch.no_grad():
-        emb = classifier.encode_batch(signal)
-    out = emb.squeeze(0).cpu().numpy().tolist()
-    return JSONResponse(content={"embedding": out})
+    emb = await _embed_signal(signal)
+    if "application/octet-stream" in (request.headers.get("accept", "") or ""):
+        return Response(
+            content=emb.to(torch.float16).numpy().astype("<f2", copy=False).tobytes(),
+            media_type="application/octet-stream",
+            headers={"X-Embedding-Dtype": "float16", "X-Embedding-Dims": str(emb.numel())},
+        )
+    # orjson serializes the float32 ndarray natively, without a Python list of floats.
+    return Response(
+        content=orjson.dumps({"embedding": emb.numpy()}, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type="application/json",
+    )
 
 
 @app.post("/verify")
@@ -130,26 +580,13 @@ async def verify(
         sig2, _ = _audio_to_tensor(raw2)
     except HTTPException:
         raise
-    f1_path = f2_path = None
-    try:
-        import soundfile as sf
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f1:
-            f1_path = f1.name
-            sf.write(f1_path, sig1.squeeze(0).numpy(), TARGET_SR)
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f2:
-            f2_path = f2.name
-            sf.write(f2_path, sig2.squeeze(0).numpy(), TARGET_SR)
-        verification = _load_verification()
-        score, prediction = verification.verify_files(f1_path, f2_path)
-        same = bool(prediction.item() if hasattr(prediction, "item") else prediction)
-        return JSONResponse(content={"same_speaker": same, "score": float(score)})
-    finally:
-        for p in (f1_path, f2_path):
-            if p and os.path.exists(p):
-                try:
-                    os.unlink(p)
-                except Exception:
-                    pass
+    # Both clips go through a single ECAPA forward as one padded (2, T) batch.
+    batch, wav_lens = _pad_batch([sig1, sig2])
+    verification = _load_verification()
+    with _inference():
+        emb = verification.encode_batch(batch, wav_lens).squeeze(1).float()
+        score, same = _verify_pair(emb[0], emb[1], VERIFY_THRESHOLD)
+    return JSONResponse(content={"same_speaker": bool(same.item()), "score": float(score.item())})
 
 
 if __name__ == "__main__":